@@ -14,25 +14,35 @@
 """Utils for constructing DP queries from TF Privacy."""
 
 from absl import logging
+import tensorflow as tf
 
 from distributed_dp import accounting_utils
 from distributed_dp import compression_query
 from distributed_dp import distributed_discrete_gaussian_query
 
 
-def _ddp_query_factory(mechanism, local_stddev, l1_norm_bound, l2_norm_bound):
+def _ddp_query_factory(mechanism, local_stddev, l1_norm_bound, l2_norm_bound,
+                       sample_dtype):
   """Factory for distributed discrete DPQuery objects from TF Privacy."""
   del l1_norm_bound  # Unused.
   mechanism = mechanism.lower()
   if mechanism == 'ddgauss':
     return distributed_discrete_gaussian_query.DistributedDiscreteGaussianSumQuery(
-        l2_norm_bound=l2_norm_bound, local_scale=local_stddev)
+        l2_norm_bound=l2_norm_bound,
+        local_scale=local_stddev,
+        sample_dtype=sample_dtype)
   else:
     raise ValueError(f'Unsupported mechanism: "{mechanism}".')
 
 
-def build_ddp_query(mechanism, local_stddev, l2_norm_bound, beta, padded_dim,
-                    scale, client_template):
+def build_ddp_query(mechanism,
+                    local_stddev,
+                    l2_norm_bound,
+                    beta,
+                    padded_dim,
+                    scale,
+                    client_template,
+                    sample_dtype=tf.float64):
   """Construct a DDP query object wrapped with quantization operations."""
   beta = beta or 0
   conditional = beta > 0
@@ -47,7 +57,8 @@ def build_ddp_query(mechanism, local_stddev, l2_norm_bound, beta, padded_dim,
       mechanism=mechanism,
       local_stddev=local_stddev * scale,
       l1_norm_bound=scaled_rounded_l1,
-      l2_norm_bound=scaled_rounded_l2)
+      l2_norm_bound=scaled_rounded_l2,
+      sample_dtype=tf.as_dtype(sample_dtype))
 
   # Wrap DDP query with quantization operations.
   quantization_params = compression_query.QuantizationParams(
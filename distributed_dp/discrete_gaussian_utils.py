@@ -28,8 +28,11 @@ that can take float parameters.
 import tensorflow as tf
 import tensorflow_probability as tf_prob
 
+# Floating point types that may be used for the intermediate sampling math.
+SAMPLE_DTYPES = (tf.float32, tf.float64)
 
-def _sample_discrete_laplace(t, shape):
+
+def _sample_discrete_laplace(t, shape, sample_dtype=tf.float64):
   """Sample from discrete Laplace with scale t.
 
   This method is based on the observation that sampling from Z ~ Lap(t) is
@@ -42,11 +45,14 @@ def _sample_discrete_laplace(t, shape):
   Args:
     t: The scale of the discrete Laplace distribution.
     shape: The tensor shape of the tensors drawn.
+    sample_dtype: The floating point type used for the geometric probabilities.
 
   Returns:
     A tensor of the specified shape filled with random values.
   """
-  geometric_probs = 1.0 - tf.exp(-1.0 / tf.cast(t, tf.float64))
+  # `1 - exp(-1/t)` cancels catastrophically for large `t` (especially in
+  # float32), so compute it as `-expm1(-1/t)`, which is accurate in both dtypes.
+  geometric_probs = -tf.math.expm1(-1.0 / tf.cast(t, sample_dtype))
   geo1 = tf_prob.distributions.Geometric(probs=geometric_probs).sample(shape)
   geo2 = tf_prob.distributions.Geometric(probs=geometric_probs).sample(shape)
   return tf.cast(geo1 - geo2, tf.int64)
@@ -57,22 +63,25 @@ def _sample_bernoulli(p):
   return tf_prob.distributions.Bernoulli(probs=p, dtype=tf.int64).sample()
 
 
-def _check_input_args(scale, shape, dtype):
+def _check_input_args(scale, shape, dtype, sample_dtype):
   """Checks the input args to the discrete Gaussian sampler."""
   if tf.as_dtype(dtype) not in (tf.int32, tf.int64):
     raise ValueError(
         f'Only tf.int32 and tf.int64 are supported. Found dtype `{dtype}`.')
+  if tf.as_dtype(sample_dtype) not in SAMPLE_DTYPES:
+    raise ValueError(f'Only {SAMPLE_DTYPES} are supported for sampling. Found '
+                     f'sample_dtype `{sample_dtype}`.')
 
   checks = [
       tf.compat.v1.assert_non_negative(scale),
       tf.compat.v1.assert_integer(scale)
   ]
   with tf.control_dependencies(checks):
-    return tf.identity(scale), shape, dtype
+    return tf.identity(scale), shape, dtype, tf.as_dtype(sample_dtype)
 
 
 @tf.function
-def _sample_discrete_gaussian_helper(scale, shape, dtype):
+def _sample_discrete_gaussian_helper(scale, shape, dtype, sample_dtype):
   """Draw samples from discrete Gaussian, assuming scale >= 0."""
   scale = tf.cast(scale, tf.int64)
   sq_scale = tf.square(scale)
@@ -101,9 +110,10 @@ def _sample_discrete_gaussian_helper(scale, shape, dtype):
     tf.autograph.experimental.set_loop_options(
         shape_invariants=[(result, tf.TensorShape([None]))])
     # Draw samples.
-    samples = _sample_discrete_laplace(dlap_scale, shape=(draw_n,))
-    z_numer = tf.pow((tf.abs(samples) - scale), 2)
-    z_denom = 2 * sq_scale
+    samples = _sample_discrete_laplace(
+        dlap_scale, shape=(draw_n,), sample_dtype=sample_dtype)
+    z_numer = tf.cast(tf.pow((tf.abs(samples) - scale), 2), sample_dtype)
+    z_denom = tf.cast(2 * sq_scale, sample_dtype)
     bern_probs = tf.exp(-tf.divide(z_numer, z_denom))
     accept = _sample_bernoulli(bern_probs)
     # Keep successful samples and increment counter.
@@ -117,7 +127,8 @@ def _sample_discrete_gaussian_helper(scale, shape, dtype):
   return tf.cast(tf.reshape(result[:target_n], shape), dtype)
 
 
-def sample_discrete_gaussian(scale, shape, dtype=tf.int32):
+def sample_discrete_gaussian(scale, shape, dtype=tf.int32,
+                             sample_dtype=tf.float64):
   """Draws (possibly inexact) samples from the discrete Gaussian distribution.
 
   We relax some integer constraints to use vectorized implementations of
@@ -128,11 +139,17 @@ def sample_discrete_gaussian(scale, shape, dtype=tf.int32):
     scale: The scale of the discrete Gaussian distribution.
     shape: The shape of the output tensor.
     dtype: The type of the output.
+    sample_dtype: The floating point type (`tf.float32` or `tf.float64`) used
+      for the geometric and Bernoulli probabilities during sampling. The
+      default `tf.float64` is the most accurate; `tf.float32` is cheaper at the
+      cost of a slightly less exact distribution.
 
   Returns:
     A tensor of the specified shape filled with random values.
   """
-  scale, shape, dtype = _check_input_args(scale, shape, dtype)
+  scale, shape, dtype, sample_dtype = _check_input_args(scale, shape, dtype,
+                                                        sample_dtype)
   return tf.cond(
       tf.equal(scale, 0), lambda: tf.zeros(shape, dtype),
-      lambda: _sample_discrete_gaussian_helper(scale, shape, dtype))
+      lambda: _sample_discrete_gaussian_helper(scale, shape, dtype,
+                                               sample_dtype))
@@ -33,6 +33,12 @@ class DiscreteGaussianUtilsTest(tf.test.TestCase, parameterized.TestCase):
     with self.assertRaises(ValueError):
       _ = discrete_gaussian_utils.sample_discrete_gaussian(1, (1,), dtype)
 
+  @parameterized.product(sample_dtype=[tf.bfloat16, tf.float16, tf.int64])
+  def test_raise_on_bad_sample_dtype(self, sample_dtype):
+    with self.assertRaises(ValueError):
+      _ = discrete_gaussian_utils.sample_discrete_gaussian(
+          1, (1,), sample_dtype=sample_dtype)
+
   def test_raise_on_negative_scale(self):
     with self.assertRaises(tf.errors.InvalidArgumentError):
       _ = discrete_gaussian_utils.sample_discrete_gaussian(-10, (1,))
@@ -64,15 +70,18 @@ class DiscreteGaussianUtilsTest(tf.test.TestCase, parameterized.TestCase):
     samples = self.evaluate(samples)
     self.assertAllEqual(samples, tf.zeros(shape, dtype=dtype))
 
-  @parameterized.named_parameters([('small_scale_small_n', 10, 2000, 1, 2),
-                                   ('small_scale_large_n', 10, 5000, 1, 1),
-                                   ('large_scale_small_n', 50, 2000, 2, 5),
-                                   ('large_scale_large_n', 50, 5000, 2, 3)])
+  @parameterized.named_parameters(
+      [('small_scale_small_n', 10, 2000, 1, 2, tf.float64),
+       ('small_scale_large_n', 10, 5000, 1, 1, tf.float64),
+       ('large_scale_small_n', 50, 2000, 2, 5, tf.float64),
+       ('large_scale_large_n', 50, 5000, 2, 3, tf.float64),
+       ('small_scale_float32', 10, 5000, 1, 1, tf.float32),
+       ('large_scale_float32', 50, 5000, 2, 3, tf.float32)])
   def test_match_exact_sampler(self, scale, num_samples, mean_std_atol,
-                               percentile_atol):
+                               percentile_atol, sample_dtype):
     true_samples = exact_sampler(scale, num_samples)
     drawn_samples = discrete_gaussian_utils.sample_discrete_gaussian(
-        scale=scale, shape=(num_samples,))
+        scale=scale, shape=(num_samples,), sample_dtype=sample_dtype)
     drawn_samples = self.evaluate(drawn_samples)
 
     # Check mean, std, and percentiles.
@@ -37,15 +37,19 @@ class DistributedDiscreteGaussianSumQuery(tfp.SumAggregationDPQuery):
   _SampleParams = collections.namedtuple('_SampleParams',
                                          ['l2_norm_bound', 'local_scale'])
 
-  def __init__(self, l2_norm_bound, local_scale):
+  def __init__(self, l2_norm_bound, local_scale, sample_dtype=tf.float64):
     """Initializes the DistributedDiscreteGaussianSumQuery.
 
     Args:
       l2_norm_bound: The L2 norm bound to verify for each record.
       local_scale: The scale (stddev) of the local discrete Gaussian noise.
+      sample_dtype: The floating point type used for the intermediate sampling
+        math of the discrete Gaussian sampler. See
+        `discrete_gaussian_utils.sample_discrete_gaussian`.
     """
     self._l2_norm_bound = l2_norm_bound
     self._local_scale = local_scale
+    self._sample_dtype = sample_dtype
 
   def set_ledger(self, ledger):
     del ledger  # Unused.
@@ -82,7 +86,10 @@ class DistributedDiscreteGaussianSumQuery(tfp.SumAggregationDPQuery):
       # Adds an extra dimension for `shares` number of draws.
       shape = tf.concat([[shares], tf.shape(v)], axis=0)
       dgauss_noise = discrete_gaussian_utils.sample_discrete_gaussian(
-          scale=ceil_local_scale, shape=shape, dtype=v.dtype)
+          scale=ceil_local_scale,
+          shape=shape,
+          dtype=v.dtype,
+          sample_dtype=self._sample_dtype)
       # Sum across the number of noise shares and add it.
       return v + tf.reduce_sum(dgauss_noise, axis=0)
 
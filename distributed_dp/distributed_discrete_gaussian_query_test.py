@@ -13,6 +13,8 @@
 # limitations under the License.
 """Tests for DistributedDiscreteGaussianQuery."""
 
+from unittest import mock
+
 from absl.testing import parameterized
 import numpy as np
 import tensorflow as tf
@@ -161,6 +163,23 @@ class DistributedDiscreteGaussianQueryTest(tf.test.TestCase,
         np.percentile(central_noise, [25, 50, 75]),
         atol=atol)
 
+  @parameterized.named_parameters([('float32', tf.float32),
+                                   ('float64', tf.float64)])
+  def test_sample_dtype_is_forwarded(self, sample_dtype):
+    record = tf.zeros([10], dtype=tf.int32)
+    query = ddg_sum_query(
+        l2_norm_bound=10.0, local_scale=2.0, sample_dtype=sample_dtype)
+    params = query.derive_sample_params(query.initial_global_state())
+    with mock.patch.object(
+        discrete_gaussian_utils,
+        'sample_discrete_gaussian',
+        wraps=discrete_gaussian_utils.sample_discrete_gaussian) as mock_sample:
+      noised_record = query.preprocess_record(params, record)
+    self.evaluate(noised_record)
+
+    mock_sample.assert_called_once()
+    self.assertEqual(mock_sample.call_args[1]['sample_dtype'], sample_dtype)
+
 
 if __name__ == '__main__':
   tf.test.main()
@@ -29,6 +29,7 @@ from distributed_dp import fl_utils
 from utils import task_utils
 from utils import training_utils
 from utils import utils_impl
+from utils.datasets import emnist_dataset
 from utils.optimizers import optimizer_utils
 
 # Hard-code the total number of clients for the datasets. Task names are defined
@@ -58,6 +59,10 @@ with utils_impl.record_hparam_flags() as shared_flags:
       'max_elements_per_client', None, 'Maximum number of '
       'elements for each training client. If set to None, all '
       'available examples are used.')
+  flags.DEFINE_string(
+      'emnist_tfrecord_dir', None, 'Optional directory for per-client TFRecord '
+      'copies of EMNIST, used by the `emnist_character` task. The copies are '
+      'created on first use. If set to None, EMNIST is read from SQLite.')
 
   # Training loop configuration
   flags.DEFINE_integer('total_rounds', 1500, 'Number of total training rounds.')
@@ -81,6 +86,11 @@ with utils_impl.record_hparam_flags() as compression_flags:
   flags.DEFINE_float('beta', math.exp(-0.5), 'Beta for stochastic rounding.')
   flags.DEFINE_integer('k_stddevs', 4,
                        'Number of stddevs to bound the signal range.')
+  flags.DEFINE_enum(
+      'dgauss_sample_dtype', 'float64', ['float64', 'float32'],
+      'Floating point type for the discrete Gaussian sampling math. float32 '
+      'is faster on some accelerators, at the cost of rounding the sampling '
+      'probabilities to single precision.')
 
 with utils_impl.record_hparam_flags() as dp_flags:
   flags.DEFINE_float(
@@ -196,8 +206,8 @@ def main(argv):
   if FLAGS.task == 'emnist_character':
     # Since we use a custom model for EMNIST, we need to manually construct the
     # TFF datasets and the TFF `Task` object.
-    emnist_train, emnist_test = tff.simulation.datasets.emnist.load_data(
-        only_digits=False)
+    emnist_train, emnist_test = emnist_dataset.load_client_data(
+        only_digits=False, tfrecord_dir=FLAGS.emnist_tfrecord_dir)
     eval_client_spec = tff.simulation.baselines.ClientSpec(
         num_epochs=1, batch_size=64, shuffle_buffer_size=1)  # No shuffling.
 
@@ -13,10 +13,11 @@
 # limitations under the License.
 """Utils for running experiments with discrete DP and compression."""
 
+import functools
+import math
 import pprint
 
 from absl import logging
-import numpy as np
 import tensorflow_federated as tff
 
 from distributed_dp import accounting_utils
@@ -26,11 +27,161 @@ from distributed_dp import modular_clipping_factory
 
 def get_total_dim(client_template):
   """Returns the dimension of the client template as a single vector."""
-  return sum(np.prod(x.shape) for x in client_template)
+  # Plain Python ints avoid a NumPy dispatch (and 0-d array) per tensor.
+  total_dim = 0
+  for x in client_template:
+    size = 1
+    for d in x.shape:
+      size *= int(d)
+    total_dim += size
+  return total_dim
 
 
 def pad_dim(dim):
-  return np.math.pow(2, np.ceil(np.log2(dim)))
+  """Returns the smallest power of 2 that is at least `dim`, as a Python int."""
+  # Integer bit-length avoids float round-off in `2**ceil(log2(dim))`.
+  dim = int(dim)
+  return 1 if dim <= 1 else 1 << (dim - 1).bit_length()
+
+
+def _log_params(header, params_dict):
+  """Logs `params_dict` at INFO level, only formatting it if INFO is enabled."""
+  if logging.level_info():
+    logging.info('%s\n%s', header, pprint.pformat(params_dict))
+
+
+@functools.lru_cache(maxsize=256)
+def _cached_ddgauss_params(q, epsilon, l2_clip_norm, bits, num_clients, dim,
+                           delta, beta, steps, k):
+  """Memoized `accounting_utils.ddgauss_params` for repeated configurations."""
+  return accounting_utils.ddgauss_params(
+      q=q,
+      epsilon=epsilon,
+      l2_clip_norm=l2_clip_norm,
+      bits=bits,
+      num_clients=num_clients,
+      dim=dim,
+      delta=delta,
+      beta=beta,
+      steps=steps,
+      k=k)
+
+
+def _build_gaussian(params_dict, compression_flags, client_template):
+  """Builds the continuous Gaussian baseline aggregator and its parameters."""
+  del compression_flags, client_template  # Unused.
+  noise_mult = accounting_utils.get_gauss_noise_multiplier(
+      target_eps=params_dict['epsilon'],
+      target_delta=params_dict['delta'],
+      target_sampling_rate=params_dict['sampling_rate'],
+      steps=params_dict['num_rounds'])
+  # Operations include clipping on client and noising + averaging on server;
+  # No MeanFactory and ClippingFactory needed.
+  agg_factory = tff.aggregators.DifferentiallyPrivateFactory.gaussian_fixed(
+      noise_multiplier=noise_mult,
+      clients_per_round=params_dict['num_clients_per_round'],
+      clip=params_dict['clip'])
+  gauss_params_dict = {'noise_mult': noise_mult}
+  _log_params('Gaussian Parameters:', gauss_params_dict)
+  return agg_factory, gauss_params_dict
+
+
+def _build_ddgauss(params_dict, compression_flags, client_template):
+  """Builds the distributed discrete Gaussian aggregator and its parameters."""
+  clip = params_dict['clip']
+  dim = params_dict['dim']
+  mechanism = params_dict['mechanism']
+  num_clients_per_round = params_dict['num_clients_per_round']
+  padded_dim = pad_dim(dim)
+  k_stddevs = compression_flags['k_stddevs'] or 4
+  beta = compression_flags['beta']
+  bits = compression_flags['num_bits']
+  sample_dtype = compression_flags.get('dgauss_sample_dtype') or 'float64'
+
+  # Modular clipping has exclusive upper bound.
+  mod_clip_lo, mod_clip_hi = -(2**(bits - 1)), 2**(bits - 1)
+
+  gamma, local_stddev = _cached_ddgauss_params(
+      q=params_dict['sampling_rate'],
+      epsilon=params_dict['epsilon'],
+      l2_clip_norm=clip,
+      bits=bits,
+      num_clients=num_clients_per_round,
+      dim=padded_dim,
+      delta=params_dict['delta'],
+      beta=beta,
+      steps=params_dict['num_rounds'],
+      k=k_stddevs)
+  scale = 1.0 / gamma
+
+  central_stddev = local_stddev * math.sqrt(num_clients_per_round)
+  noise_mult_clip = central_stddev / clip
+  inflated_l2 = accounting_utils.rounded_l2_norm_bound(
+      clip * scale, beta=beta, dim=padded_dim) / scale
+  noise_mult_inflated = central_stddev / inflated_l2
+
+  discrete_params_dict = {
+      'bits': bits,
+      'beta': beta,
+      'dim': dim,
+      'padded_dim': padded_dim,
+      'gamma': gamma,
+      'scale': scale,
+      'k_stddevs': k_stddevs,
+      'sample_dtype': sample_dtype,
+      'local_stddev': local_stddev,
+      'mechanism': mechanism,
+      'inflated_l2': inflated_l2,
+      'noise_mult_clip': noise_mult_clip,
+      'noise_mult_inflated': noise_mult_inflated,
+  }
+
+  _log_params('DDGauss Parameters:', discrete_params_dict)
+
+  # Build nested aggregators.
+  agg_factory = tff.aggregators.SumFactory()
+  # 1. Modular clipping.
+  agg_factory = modular_clipping_factory.ModularClippingSumFactory(
+      clip_range_lower=mod_clip_lo,
+      clip_range_upper=mod_clip_hi,
+      inner_agg_factory=agg_factory,
+      upload_dtype=modular_clipping_factory.select_upload_dtype(bits))
+
+  # 2. Quantization followed by the distributed DP mechanism.
+  ddp_query = ddpquery_utils.build_ddp_query(
+      mechanism=mechanism,
+      local_stddev=local_stddev,
+      l2_norm_bound=clip,
+      beta=beta,
+      padded_dim=padded_dim,
+      scale=scale,
+      client_template=client_template,
+      sample_dtype=sample_dtype)
+
+  agg_factory = tff.aggregators.DifferentiallyPrivateFactory(
+      query=ddp_query, record_aggregation_factory=agg_factory)
+
+  # 3. L2 norm clipping as the first step.
+  agg_factory = tff.aggregators.clipping_factory(
+      clipping_norm=clip, inner_agg_factory=agg_factory)
+
+  # 4. Apply a MeanFactory at last (mean can't be part of the discrete
+  # DPQueries (like the case of Gaussian) as the records may become floats
+  # and hence break the decompression process).
+  agg_factory = tff.aggregators.UnweightedMeanFactory(
+      value_sum_factory=agg_factory)
+
+  return agg_factory, discrete_params_dict
+
+
+# Maps a (lowercase) DP mechanism name to a function that builds its aggregator
+# and mechanism-specific parameters from the shared DP parameters.
+MECHANISM_BUILDERS = {
+    # Baseline: continuous Gaussian.
+    'gaussian': _build_gaussian,
+    # Distributed Discrete Gaussian.
+    'ddgauss': _build_ddgauss,
+}
 
 
 def build_aggregator(compression_flags, dp_flags, num_clients,
@@ -51,9 +202,11 @@ def build_aggregator(compression_flags, dp_flags, num_clients,
   # Parameters for DP
   assert epsilon > 0, f'Epsilon should be positive, found {epsilon}.'
   assert clip is not None and clip > 0, f'Clip must be positive, found {clip}.'
+  mechanism = dp_flags['dp_mechanism'].lower()
+  if mechanism not in MECHANISM_BUILDERS:
+    raise ValueError(f'Unsupported mechanism: {dp_flags["dp_mechanism"]}')
   sampling_rate = float(num_clients_per_round) / num_clients
   delta = dp_flags['delta'] or 1.0 / num_clients  # Default to delta = 1 / N.
-  mechanism = dp_flags['dp_mechanism'].lower()
   dim = get_total_dim(client_template)
 
   params_dict = {
@@ -68,107 +221,10 @@ def build_aggregator(compression_flags, dp_flags, num_clients,
       'num_rounds': num_rounds
   }
 
-  logging.info('Shared DP Parameters:')
-  logging.info(pprint.pformat(params_dict))
-
-  # Baseline: continuous Gaussian.
-  if mechanism == 'gaussian':
-    noise_mult = accounting_utils.get_gauss_noise_multiplier(
-        target_eps=epsilon,
-        target_delta=delta,
-        target_sampling_rate=sampling_rate,
-        steps=num_rounds)
-    # Operations include clipping on client and noising + averaging on server;
-    # No MeanFactory and ClippingFactory needed.
-    agg_factory = tff.aggregators.DifferentiallyPrivateFactory.gaussian_fixed(
-        noise_multiplier=noise_mult,
-        clients_per_round=num_clients_per_round,
-        clip=clip)
-    gauss_params_dict = {'noise_mult': noise_mult}
-    logging.info('Gaussian Parameters:')
-    logging.info(gauss_params_dict)
-    params_dict.update(gauss_params_dict)
-
-  # Distributed Discrete Gaussian
-  elif mechanism == 'ddgauss':
-    padded_dim = pad_dim(dim)
-    k_stddevs = compression_flags['k_stddevs'] or 4
-    beta = compression_flags['beta']
-    bits = compression_flags['num_bits']
-
-    # Modular clipping has exclusive upper bound.
-    mod_clip_lo, mod_clip_hi = -(2**(bits - 1)), 2**(bits - 1)
-
-    gamma, local_stddev = accounting_utils.ddgauss_params(
-        q=sampling_rate,
-        epsilon=epsilon,
-        l2_clip_norm=clip,
-        bits=bits,
-        num_clients=num_clients_per_round,
-        dim=padded_dim,
-        delta=delta,
-        beta=beta,
-        steps=num_rounds,
-        k=k_stddevs)
-    scale = 1.0 / gamma
-
-    central_stddev = local_stddev * np.sqrt(num_clients_per_round)
-    noise_mult_clip = central_stddev / clip
-    inflated_l2 = accounting_utils.rounded_l2_norm_bound(
-        clip * scale, beta=beta, dim=padded_dim) / scale
-    noise_mult_inflated = central_stddev / inflated_l2
-
-    discrete_params_dict = {
-        'bits': bits,
-        'beta': beta,
-        'dim': dim,
-        'padded_dim': padded_dim,
-        'gamma': gamma,
-        'scale': scale,
-        'k_stddevs': k_stddevs,
-        'local_stddev': local_stddev,
-        'mechanism': mechanism,
-        'inflated_l2': inflated_l2,
-        'noise_mult_clip': noise_mult_clip,
-        'noise_mult_inflated': noise_mult_inflated,
-    }
-
-    logging.info('DDGauss Parameters:')
-    logging.info(pprint.pformat(discrete_params_dict))
-    params_dict.update(discrete_params_dict)
-
-    # Build nested aggregators.
-    agg_factory = tff.aggregators.SumFactory()
-    # 1. Modular clipping.
-    agg_factory = modular_clipping_factory.ModularClippingSumFactory(
-        clip_range_lower=mod_clip_lo,
-        clip_range_upper=mod_clip_hi,
-        inner_agg_factory=agg_factory)
-
-    # 2. Quantization followed by the distributed DP mechanism.
-    ddp_query = ddpquery_utils.build_ddp_query(
-        mechanism=mechanism,
-        local_stddev=local_stddev,
-        l2_norm_bound=clip,
-        beta=beta,
-        padded_dim=padded_dim,
-        scale=scale,
-        client_template=client_template)
-
-    agg_factory = tff.aggregators.DifferentiallyPrivateFactory(
-        query=ddp_query, record_aggregation_factory=agg_factory)
-
-    # 3. L2 norm clipping as the first step.
-    agg_factory = tff.aggregators.clipping_factory(
-        clipping_norm=clip, inner_agg_factory=agg_factory)
-
-    # 4. Apply a MeanFactory at last (mean can't be part of the discrete
-    # DPQueries (like the case of Gaussian) as the records may become floats
-    # and hence break the decompression process).
-    agg_factory = tff.aggregators.UnweightedMeanFactory(
-        value_sum_factory=agg_factory)
-
-  else:
-    raise ValueError(f'Unsupported mechanism: {dp_flags["dp_mechanism"]}')
+  _log_params('Shared DP Parameters:', params_dict)
+
+  agg_factory, mechanism_params_dict = MECHANISM_BUILDERS[mechanism](
+      params_dict, compression_flags, client_template)
+  params_dict.update(mechanism_params_dict)
 
   return agg_factory, params_dict
@@ -0,0 +1,102 @@
+# Copyright 2021, Google LLC. All rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for fl_utils."""
+
+import math
+
+from absl.testing import parameterized
+import tensorflow as tf
+import tensorflow_federated as tff
+
+from distributed_dp import fl_utils
+
+
+class PadDimTest(tf.test.TestCase, parameterized.TestCase):
+
+  @parameterized.named_parameters(
+      ('one', 1, 1),
+      ('two', 2, 2),
+      ('three', 3, 4),
+      ('power_of_2', 2**20, 2**20),
+      ('above_power_of_2', 2**20 + 1, 2**21),
+      ('above_float64_precision', 2**53 + 1, 2**54),
+      ('below_large_power_of_2', 2**60 - 1, 2**60))
+  def test_pad_dim(self, dim, expected_padded_dim):
+    padded_dim = fl_utils.pad_dim(dim)
+    self.assertIsInstance(padded_dim, int)
+    self.assertEqual(padded_dim, expected_padded_dim)
+
+
+_CLIENT_TEMPLATE = [tf.zeros([10]), tf.zeros([3, 4])]
+_VALUE_TYPE = tff.to_type([(tf.float32, (10,)), (tf.float32, (3, 4))])
+
+
+def _build_aggregator(dp_mechanism, num_bits=16, epsilon=10.0):
+  compression_flags = {
+      'num_bits': num_bits,
+      'beta': math.exp(-0.5),
+      'k_stddevs': 4,
+      'dgauss_sample_dtype': 'float64',
+  }
+  dp_flags = {
+      'epsilon': epsilon,
+      'delta': None,
+      'l2_norm_clip': 2.0,
+      'dp_mechanism': dp_mechanism,
+  }
+  return fl_utils.build_aggregator(
+      compression_flags=compression_flags,
+      dp_flags=dp_flags,
+      num_clients=100,
+      num_clients_per_round=10,
+      num_rounds=10,
+      client_template=_CLIENT_TEMPLATE)
+
+
+class BuildAggregatorTest(tf.test.TestCase, parameterized.TestCase):
+
+  def test_no_dp(self):
+    agg_factory, params_dict = _build_aggregator('ddgauss', epsilon=None)
+    process = agg_factory.create(_VALUE_TYPE)
+    self.assertIsInstance(process, tff.templates.AggregationProcess)
+    self.assertEqual(params_dict, {'clip': 2.0})
+
+  def test_gaussian(self):
+    agg_factory, params_dict = _build_aggregator('gaussian')
+    process = agg_factory.create(_VALUE_TYPE)
+    self.assertIsInstance(process, tff.templates.AggregationProcess)
+    self.assertEqual(params_dict['mechanism'], 'gaussian')
+    self.assertEqual(params_dict['dim'], 22)
+    self.assertGreater(params_dict['noise_mult'], 0)
+
+  @parameterized.named_parameters(('8_bits', 8), ('16_bits', 16),
+                                  ('20_bits', 20))
+  def test_ddgauss(self, num_bits):
+    agg_factory, params_dict = _build_aggregator('DDGauss', num_bits=num_bits)
+    process = agg_factory.create(_VALUE_TYPE)
+    self.assertIsInstance(process, tff.templates.AggregationProcess)
+    self.assertEqual(params_dict['mechanism'], 'ddgauss')
+    self.assertEqual(params_dict['bits'], num_bits)
+    self.assertEqual(params_dict['dim'], 22)
+    self.assertEqual(params_dict['padded_dim'], 32)
+    self.assertEqual(params_dict['sample_dtype'], 'float64')
+    self.assertGreater(params_dict['local_stddev'], 0)
+
+  def test_raises_on_unknown_mechanism(self):
+    with self.assertRaisesRegex(ValueError, 'Unsupported mechanism'):
+      _build_aggregator('laplace')
+
+
+if __name__ == '__main__':
+  tf.test.main()
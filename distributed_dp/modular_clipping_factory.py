@@ -20,6 +20,7 @@ import tensorflow as tf
 import tensorflow_federated as tff
 
 CLIP_VALUE_TF_TYPE = tf.int32
+UPLOAD_TF_TYPES = (tf.int8, tf.int16, tf.int32)
 
 
 class ModularClippingSumFactory(tff.aggregators.UnweightedAggregationFactory):
@@ -37,13 +38,21 @@ class ModularClippingSumFactory(tff.aggregators.UnweightedAggregationFactory):
 
   The clipping logic implemented in this factory may also apply to floating
   inputs, though for now our intention is to use it with tf.int32 records.
+
+  If `upload_dtype` is set (e.g. `tf.int8` or `tf.int16`), the clipped tf.int32
+  client values are cast to this narrower container before being passed to the
+  inner aggregation, and the aggregate is cast back to tf.int32 and clipped
+  again on the server. Because the width of the clipping range must then be a
+  power of 2 that fits `upload_dtype`, any wrap-around of the narrow sum is
+  congruent to the true sum modulo the range width, so the result is unchanged.
   """
 
   def __init__(
       self,
       clip_range_lower: int,
       clip_range_upper: int,
-      inner_agg_factory: Optional[tff.aggregators.UnweightedAggregationFactory] = None):  # pylint: disable=line-too-long
+      inner_agg_factory: Optional[tff.aggregators.UnweightedAggregationFactory] = None,  # pylint: disable=line-too-long
+      upload_dtype: Optional[tf.dtypes.DType] = None):
 
     if inner_agg_factory is None:
       inner_agg_factory = tff.aggregators.SumFactory()
@@ -68,14 +77,40 @@ class ModularClippingSumFactory(tff.aggregators.UnweightedAggregationFactory):
                        f'tf.int32. Found clip_range_lower={clip_range_lower} '
                        f'and clip_range_upper={clip_range_upper} respectively.')
 
+    if upload_dtype is not None:
+      if upload_dtype not in UPLOAD_TF_TYPES:
+        raise ValueError(f'`upload_dtype` must be one of {UPLOAD_TF_TYPES}, '
+                         f'found {upload_dtype}.')
+      width = clip_range_upper - clip_range_lower
+      if (width & (width - 1) or clip_range_lower < upload_dtype.min or
+          clip_range_upper - 1 > upload_dtype.max):
+        raise ValueError('With `upload_dtype` set, the clipping range must '
+                         'have a power of 2 width and fit within '
+                         f'{upload_dtype.name}. Found '
+                         f'clip_range_lower={clip_range_lower} and '
+                         f'clip_range_upper={clip_range_upper} respectively.')
+    self._upload_dtype = upload_dtype
+
     self._get_clip_range = _create_get_clip_range_const(clip_range_lower,
                                                         clip_range_upper)
 
   def create(self, value_type) -> tff.templates.AggregationProcess:
-    inner_agg_process = self._inner_agg_factory.create(value_type)
+    if self._upload_dtype is None:
+      narrow_fn = widen_fn = None
+      inner_value_type = value_type
+    else:
+      narrow_fn = tff.tf_computation(
+          lambda v: _cast_int32_structure(v, self._upload_dtype), value_type)
+      inner_value_type = narrow_fn.type_signature.result
+      widen_fn = tff.tf_computation(
+          lambda v: tf.nest.map_structure(
+              lambda t: tf.cast(t, CLIP_VALUE_TF_TYPE), v), inner_value_type)
+
+    inner_agg_process = self._inner_agg_factory.create(inner_value_type)
     init_fn = self._create_init_fn(inner_agg_process.initialize)
     next_fn = self._create_next_fn(inner_agg_process.next,
-                                   init_fn.type_signature.result)
+                                   init_fn.type_signature.result, value_type,
+                                   narrow_fn, widen_fn)
     return tff.templates.AggregationProcess(init_fn, next_fn)
 
   def _create_init_fn(self, inner_agg_initialize):
@@ -86,9 +121,10 @@ class ModularClippingSumFactory(tff.aggregators.UnweightedAggregationFactory):
 
     return init_fn
 
-  def _create_next_fn(self, inner_agg_next, state_type):
+  def _create_next_fn(self, inner_agg_next, state_type, value_type, narrow_fn,
+                      widen_fn):
 
-    value_type = inner_agg_next.type_signature.parameter[1]
+    value_type = tff.type_at_clients(value_type)
     modular_clip_by_value_tff = tff.tf_computation(modular_clip_by_value)
 
     @tff.federated_computation(state_type, value_type)
@@ -101,9 +137,16 @@ class ModularClippingSumFactory(tff.aggregators.UnweightedAggregationFactory):
           (value, tff.federated_broadcast(clip_range_lower),
            tff.federated_broadcast(clip_range_upper)))
 
+      # Cast to the narrower container for upload, if requested.
+      if narrow_fn is not None:
+        clipped_value = tff.federated_map(narrow_fn, clipped_value)
+
       (agg_output_state, agg_output_result,
        agg_output_measurements) = inner_agg_next(state, clipped_value)
 
+      if widen_fn is not None:
+        agg_output_result = tff.federated_map(widen_fn, agg_output_result)
+
       # Clip the aggregate to the same range again (not considering summands).
       clipped_agg_output_result = tff.federated_map(
           modular_clip_by_value_tff,
@@ -123,14 +166,42 @@ class ModularClippingSumFactory(tff.aggregators.UnweightedAggregationFactory):
 def modular_clip_by_value(value, clip_range_lower, clip_range_upper):
 
   def mod_clip(v):
-    width = clip_range_upper - clip_range_lower
-    period = tf.cast(tf.floor(v / width - clip_range_lower / width), v.dtype)
-    v_mod_clipped = v - period * width
-    return v_mod_clipped
+    # A single `floormod` replaces the divide/floor/multiply/subtract chain.
+    # Integer inputs are widened so that `v - clip_range_lower` cannot overflow.
+    compute_dtype = tf.int64 if v.dtype.is_integer else v.dtype
+    lower = tf.cast(clip_range_lower, compute_dtype)
+    width = tf.cast(clip_range_upper, compute_dtype) - lower
+    v_mod_clipped = tf.math.floormod(tf.cast(v, compute_dtype) - lower,
+                                     width) + lower
+    return tf.cast(v_mod_clipped, v.dtype)
 
   return tf.nest.map_structure(mod_clip, value)
 
 
+def _cast_int32_structure(value, dtype):
+
+  def cast(v):
+    if v.dtype != CLIP_VALUE_TF_TYPE:
+      raise TypeError('`upload_dtype` requires tf.int32 values, found '
+                      f'{v.dtype}.')
+    return tf.cast(v, dtype)
+
+  return tf.nest.map_structure(cast, value)
+
+
+def select_upload_dtype(bits: int) -> Optional[tf.dtypes.DType]:
+  """Returns the narrowest integer dtype that holds `bits`-bit values.
+
+  Returns `None` if the values need the full int32 range, in which case no
+  narrowing is needed for the upload.
+  """
+  if bits <= 8:
+    return tf.int8
+  elif bits <= 16:
+    return tf.int16
+  return None
+
+
 def _create_get_clip_range_const(clip_range_lower, clip_range_upper):
 
   def get_clip_range():
@@ -54,6 +54,33 @@ class ModularClippingSumFactoryComputationTest(tff.test.TestCase,
     with self.assertRaises(TypeError):
       _ = _clipped_sum(tf.constant(0), tf.constant(1))
 
+  def test_raise_on_invalid_upload_dtype(self):
+    with self.assertRaises(ValueError):
+      _ = modular_clipping_factory.ModularClippingSumFactory(
+          -4, 4, upload_dtype=tf.float32)
+    with self.assertRaises(ValueError):
+      _ = modular_clipping_factory.ModularClippingSumFactory(
+          -3, 3, upload_dtype=tf.int8)
+    with self.assertRaises(ValueError):
+      _ = modular_clipping_factory.ModularClippingSumFactory(
+          -256, 256, upload_dtype=tf.int8)
+
+  @parameterized.named_parameters(
+      ('int', tf.int32),
+      ('struct', _test_struct_type))
+  def test_upload_dtype_preserves_type_signature(self, value_type):
+    factory = modular_clipping_factory.ModularClippingSumFactory(
+        -4, 4, tff.aggregators.SumFactory(), upload_dtype=tf.int8)
+    value_type = tff.to_type(value_type)
+    process = factory.create(value_type)
+
+    self.assertTrue(
+        process.next.type_signature.parameter.value.is_equivalent_to(
+            tff.type_at_clients(value_type)))
+    self.assertTrue(
+        process.next.type_signature.result.result.is_equivalent_to(
+            tff.type_at_server(value_type)))
+
   @parameterized.named_parameters(
       ('int', tf.int32),
       ('struct', _test_struct_type))
@@ -153,6 +180,35 @@ class ClippingFactoryExecutionTest(tff.test.TestCase, parameterized.TestCase):
     output = process.next(state, client_struct_data)
     self._check_result(expected_sum, output.result)
 
+  @parameterized.named_parameters([
+      ('int8_in_range', tf.int8, -4, 4, [1, -2, 1, -2], -2),
+      ('int8_wraps', tf.int8, -4, 4, [3] * 50, -2),
+      ('int8_full_range', tf.int8, -128, 128, [100, 100, 100], 44),
+      ('int16_wraps', tf.int16, -2**11, 2**11, [2**11 - 1] * 20, -20)])
+  def test_clip_sum_with_upload_dtype(self, upload_dtype, clip_range_lower,
+                                      clip_range_upper, client_data,
+                                      expected_sum):
+    factory = modular_clipping_factory.ModularClippingSumFactory(
+        clip_range_lower, clip_range_upper, tff.aggregators.SumFactory(),
+        upload_dtype=upload_dtype)
+
+    value_type = tff.to_type(tf.int32)
+    process = factory.create(value_type)
+
+    state = process.initialize()
+    output = process.next(state, client_data)
+    self.assertEqual(output.result, expected_sum)
+
+  @parameterized.named_parameters([
+      ('int8', 2, tf.int8),
+      ('int8_boundary', 8, tf.int8),
+      ('int16', 9, tf.int16),
+      ('int16_boundary', 16, tf.int16),
+      ('no_narrowing', 17, None)])
+  def test_select_upload_dtype(self, bits, expected_dtype):
+    self.assertEqual(
+        modular_clipping_factory.select_upload_dtype(bits), expected_dtype)
+
 
 if __name__ == '__main__':
   tff.test.main()
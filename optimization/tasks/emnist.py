@@ -14,6 +14,7 @@
 """Federated EMNIST character recognition library using TFF."""
 
 import functools
+from typing import Optional
 
 import tensorflow as tf
 import tensorflow_federated as tff
@@ -24,9 +25,18 @@ from utils.models import emnist_models
 
 EMNIST_MODELS = ['cnn', '2nn', '1m_cnn']
 
+# The element structure produced by `emnist_dataset.create_preprocess_fn` for
+# the digit recognition task. This is static, so we avoid inferring it from the
+# preprocessed `ClientData`.
+_INPUT_SPEC = (tf.TensorSpec(shape=(None, 28, 28, 1), dtype=tf.float32),
+               tf.TensorSpec(shape=(None,), dtype=tf.int32))
 
-def configure_training(task_spec: training_specs.TaskSpec,
-                       model: str = 'cnn') -> training_specs.RunnerSpec:
+
+def configure_training(
+    task_spec: training_specs.TaskSpec,
+    model: str = 'cnn',
+    tfrecord_dir: Optional[str] = None,
+    cache_path: Optional[str] = None) -> training_specs.RunnerSpec:
   """Configures training for the EMNIST character recognition task.
 
   This method will load and pre-process datasets and construct a model used for
@@ -39,22 +49,38 @@ def configure_training(task_spec: training_specs.TaskSpec,
       one of `cnn`, `2nn`, or `1m_cnn`, corresponding to a simple CNN model,
       a densely connected 2-layer model, and a CNN model with roughly 1 miilion
       (< 2^20) parameters, respectively.
+    tfrecord_dir: An optional directory for per-client TFRecord copies of
+      EMNIST, as in `emnist_dataset.load_client_data`. If `None`, the
+      SQLite-backed data is used directly.
+    cache_path: An optional path prefix for caching the raw centralized test
+      dataset to files, as in `emnist_dataset.get_centralized_test_dataset`.
+      The file cache persists across evaluation calls, so the test set is not
+      rescanned on every call to `test_fn` or `validation_fn`. If `None`, no
+      caching is done.
 
   Returns:
     A `RunnerSpec` containing attributes used for running the newly created
     federated task.
   """
   emnist_task = 'digit_recognition'
-  emnist_train, _ = tff.simulation.datasets.emnist.load_data(only_digits=False)
-  _, emnist_test = emnist_dataset.get_centralized_datasets(
-      only_digits=False, emnist_task=emnist_task)
+  emnist_train_client_data, emnist_test_client_data = (
+      emnist_dataset.load_client_data(
+          only_digits=False, tfrecord_dir=tfrecord_dir))
+
+  # The centralized test set and evaluation computation are only built if
+  # `test_fn` or `validation_fn` is actually called.
+  @functools.lru_cache(maxsize=1)
+  def get_test_dataset():
+    return emnist_dataset.get_centralized_test_dataset(
+        emnist_task=emnist_task,
+        test_client_data=emnist_test_client_data,
+        cache_path=cache_path)
 
   train_preprocess_fn = emnist_dataset.create_preprocess_fn(
       num_epochs=task_spec.client_epochs_per_round,
       batch_size=task_spec.client_batch_size,
       emnist_task=emnist_task)
-  emnist_train = emnist_train.preprocess(train_preprocess_fn)
-  input_spec = emnist_train.element_type_structure
+  emnist_train = emnist_train_client_data.preprocess(train_preprocess_fn)
 
   if model == 'cnn':
     model_builder = functools.partial(
@@ -70,13 +96,17 @@ def configure_training(task_spec: training_specs.TaskSpec,
         'Cannot handle model flag [{!s}], must be one of {!s}.'.format(
             model, EMNIST_MODELS))
 
+  # The model topology is invariant across calls to `tff_model_fn`, so we build
+  # it once and clone it (with freshly initialized weights) on each call.
+  keras_model_template = model_builder()
+
   loss_builder = tf.keras.losses.SparseCategoricalCrossentropy
   metrics_builder = lambda: [tf.keras.metrics.SparseCategoricalAccuracy()]
 
   def tff_model_fn() -> tff.learning.Model:
     return tff.learning.from_keras_model(
-        keras_model=model_builder(),
-        input_spec=input_spec,
+        keras_model=tf.keras.models.clone_model(keras_model_template),
+        input_spec=_INPUT_SPEC,
         loss=loss_builder(),
         metrics=metrics_builder())
 
@@ -91,20 +121,23 @@ def configure_training(task_spec: training_specs.TaskSpec,
       size=task_spec.clients_per_round)
   # We convert the output to a list (instead of an np.ndarray) so that it can
   # be used as input to the iterative process.
-  client_sampling_fn = lambda x: list(client_ids_fn(x))
+  client_sampling_fn = lambda x: client_ids_fn(x).tolist()
 
   training_process.get_model_weights = iterative_process.get_model_weights
 
-  evaluate_fn = tff.learning.build_federated_evaluation(tff_model_fn)
+  @functools.lru_cache(maxsize=1)
+  def get_evaluate_fn():
+    return tff.learning.build_federated_evaluation(
+        tff_model_fn, use_experimental_simulation_loop=True)
 
   def test_fn(state):
-    return evaluate_fn(
-        iterative_process.get_model_weights(state), [emnist_test])
+    return get_evaluate_fn()(
+        iterative_process.get_model_weights(state), [get_test_dataset()])
 
   def validation_fn(state, round_num):
     del round_num
-    return evaluate_fn(
-        iterative_process.get_model_weights(state), [emnist_test])
+    return get_evaluate_fn()(
+        iterative_process.get_model_weights(state), [get_test_dataset()])
 
   return training_specs.RunnerSpec(
       iterative_process=training_process,
@@ -133,7 +133,7 @@ def configure_training(
       size=task_spec.clients_per_round)
   # We convert the output to a list (instead of an np.ndarray) so that it can
   # be used as input to the iterative process.
-  client_sampling_fn = lambda x: list(client_ids_fn(x))
+  client_sampling_fn = lambda x: client_ids_fn(x).tolist()
 
   training_process.get_model_weights = iterative_process.get_model_weights
 
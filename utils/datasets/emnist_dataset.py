@@ -13,7 +13,10 @@
 # limitations under the License.
 """Library for loading and preprocessing EMNIST training and testing data."""
 
-from typing import Tuple
+import collections
+import functools
+import os
+from typing import Optional, Tuple
 
 import tensorflow as tf
 import tensorflow_federated as tff
@@ -21,15 +24,175 @@ import tensorflow_federated as tff
 MAX_CLIENT_DATASET_SIZE = 418
 
 
+def load_client_data(
+    only_digits: bool = False,
+    tfrecord_dir: Optional[str] = None
+) -> Tuple[tff.simulation.datasets.ClientData,
+           tff.simulation.datasets.ClientData]:
+  """Loads the raw federated EMNIST training and testing sets.
+
+  This wraps `tff.simulation.datasets.emnist.load_data`, and is memoized so that
+  repeated calls do not reload the SQLite-backed data, however the arguments
+  are passed.
+
+  Args:
+    only_digits: A boolean representing whether to take the digits-only
+      EMNIST-10 (with only 10 labels) or the full EMNIST-62 dataset with digits
+      and characters (62 labels).
+    tfrecord_dir: An optional directory for per-client TFRecord copies of
+      EMNIST. If set, the SQLite-backed data is converted to TFRecord files in
+      this directory on first use, and client datasets are read from those
+      files instead. If `None`, the SQLite-backed data is used directly.
+
+  Returns:
+    A tuple (emnist_train, emnist_test) of unpreprocessed
+    `tff.simulation.datasets.ClientData` instances.
+  """
+  # `functools.lru_cache` keys on how arguments are passed, so always call the
+  # cached loader with both arguments given positionally.
+  return _load_client_data(only_digits, tfrecord_dir)
+
+
+@functools.lru_cache(maxsize=4)
+def _load_client_data(
+    only_digits: bool, tfrecord_dir: Optional[str]
+) -> Tuple[tff.simulation.datasets.ClientData,
+           tff.simulation.datasets.ClientData]:
+  if tfrecord_dir is not None:
+    return _load_emnist_from_tfrecords(only_digits, tfrecord_dir)
+  return tff.simulation.datasets.emnist.load_data(only_digits=only_digits)
+
+
+_TFRECORD_FEATURES = collections.OrderedDict(
+    label=tf.io.FixedLenFeature([], tf.int64),
+    pixels=tf.io.FixedLenFeature([28, 28], tf.float32))
+_CLIENT_IDS_FILENAME = 'client_ids.txt'
+
+
+def _get_tfrecord_split_dir(tfrecord_dir: str, only_digits: bool,
+                            split: str) -> str:
+  return os.path.join(tfrecord_dir, 'digits' if only_digits else 'all', split)
+
+
+def _write_client_data_to_tfrecords(
+    client_data: tff.simulation.datasets.ClientData, split_dir: str):
+  """Writes each client's examples to `{split_dir}/{client_id}.tfrecord`."""
+  tf.io.gfile.makedirs(split_dir)
+  for client_id in client_data.client_ids:
+    path = os.path.join(split_dir, client_id + '.tfrecord')
+    with tf.io.TFRecordWriter(path) as writer:
+      for element in client_data.create_tf_dataset_for_client(client_id):
+        example = tf.train.Example(
+            features=tf.train.Features(
+                feature={
+                    'label':
+                        tf.train.Feature(
+                            int64_list=tf.train.Int64List(
+                                value=[element['label'].numpy()])),
+                    'pixels':
+                        tf.train.Feature(
+                            float_list=tf.train.FloatList(
+                                value=element['pixels'].numpy().flatten())),
+                }))
+        writer.write(example.SerializeToString())
+  # The client id list is written last, so that its presence marks a complete
+  # conversion.
+  with tf.io.gfile.GFile(os.path.join(split_dir, _CLIENT_IDS_FILENAME),
+                         'w') as f:
+    f.write('\n'.join(client_data.client_ids))
+
+
+def _convert_emnist_to_tfrecords(only_digits: bool, tfrecord_dir: str):
+  """Converts the SQLite-backed EMNIST data to per-client TFRecord files.
+
+  Splits that were already converted are skipped, and the SQLite-backed data is
+  only loaded if at least one split still needs converting.
+
+  Args:
+    only_digits: Whether to convert EMNIST-10 (if True) or EMNIST-62.
+    tfrecord_dir: The directory in which the TFRecord files are stored.
+  """
+  split_dirs = collections.OrderedDict(
+      (split, _get_tfrecord_split_dir(tfrecord_dir, only_digits, split))
+      for split in ('train', 'test'))
+  missing_splits = [
+      split for split, split_dir in split_dirs.items()
+      if not tf.io.gfile.exists(os.path.join(split_dir, _CLIENT_IDS_FILENAME))
+  ]
+  if not missing_splits:
+    return
+  emnist_train, emnist_test = load_client_data(only_digits)
+  client_data_by_split = dict(train=emnist_train, test=emnist_test)
+  for split in missing_splits:
+    _write_client_data_to_tfrecords(client_data_by_split[split],
+                                    split_dirs[split])
+
+
+def _parse_tfrecord_example(serialized_example):
+  features = tf.io.parse_single_example(serialized_example, _TFRECORD_FEATURES)
+  return collections.OrderedDict(
+      label=tf.cast(features['label'], tf.int32), pixels=features['pixels'])
+
+
+def _load_emnist_from_tfrecords(
+    only_digits: bool, tfrecord_dir: str
+) -> Tuple[tff.simulation.datasets.ClientData,
+           tff.simulation.datasets.ClientData]:
+  """Loads EMNIST `ClientData` backed by per-client TFRecord files.
+
+  The TFRecord files are created from the SQLite-backed EMNIST data on first
+  use, and reused afterwards.
+
+  Args:
+    only_digits: Whether to load EMNIST-10 (if True) or EMNIST-62.
+    tfrecord_dir: The directory in which the TFRecord files are stored.
+
+  Returns:
+    A tuple (emnist_train, emnist_test) of `tff.simulation.datasets.ClientData`
+    with the same element structure as `tff.simulation.datasets.emnist`.
+  """
+  _convert_emnist_to_tfrecords(only_digits, tfrecord_dir)
+
+  def load_split(split):
+    split_dir = _get_tfrecord_split_dir(tfrecord_dir, only_digits, split)
+    with tf.io.gfile.GFile(os.path.join(split_dir, _CLIENT_IDS_FILENAME)) as f:
+      client_ids = f.read().split('\n')
+
+    def dataset_fn(client_id):
+      path = tf.strings.join([split_dir, '/', client_id, '.tfrecord'])
+      return tf.data.TFRecordDataset(path).map(
+          _parse_tfrecord_example,
+          num_parallel_calls=tf.data.experimental.AUTOTUNE)
+
+    return tff.simulation.datasets.ClientData.from_clients_and_tf_fn(
+        client_ids, dataset_fn)
+
+  return load_split('train'), load_split('test')
+
+
+# Note: the mapping functions below are traced into the `tf.data` graph once,
+# so they do not incur per-element eager dispatch. They are intentionally not
+# wrapped in `tf.function(jit_compile=True)`: XLA cannot fuse across `tf.data`
+# ops, and compiled calls would be embedded in the dataset graphs that TFF
+# serializes for clients.
 def _reshape_for_digit_recognition(element):
   return (tf.expand_dims(element['pixels'], axis=-1), element['label'])
 
 
 def _reshape_for_autoencoder(element):
-  x = 1 - tf.reshape(element['pixels'], (-1, 28 * 28))
+  x = 1 - tf.reshape(element['pixels'], (28 * 28,))
   return (x, x)
 
 
+def _get_dataset_options() -> tf.data.Options:
+  """Returns `tf.data.Options` enabling map and batch graph optimizations."""
+  options = tf.data.Options()
+  options.experimental_optimization.map_and_batch_fusion = True
+  options.experimental_optimization.map_parallelization = True
+  options.experimental_optimization.parallel_batch = True
+  return options
+
+
 def create_preprocess_fn(
     num_epochs: int,
     batch_size: int,
@@ -39,9 +202,10 @@ def create_preprocess_fn(
 ) -> tff.Computation:
   """Creates a preprocessing function for EMNIST client datasets.
 
-  The preprocessing shuffles, repeats, batches, and then reshapes, using
-  the `shuffle`, `repeat`, `batch`, and `map` attributes of a
-  `tf.data.Dataset`, in that order.
+  The preprocessing shuffles, repeats, reshapes, batches, and then prefetches,
+  using the `shuffle`, `repeat`, `map`, `batch`, and `prefetch` attributes of a
+  `tf.data.Dataset`, in that order. Mapping before batching lets `tf.data` fuse
+  the per-element reshape into the batching step.
 
   Args:
     num_epochs: An integer representing the number of epochs to repeat the
@@ -72,10 +236,20 @@ def create_preprocess_fn(
     raise ValueError('emnist_task must be one of "digit_recognition" or '
                      '"autoencoder".')
 
+  # When repeating a client dataset for several local epochs, reuse the same
+  # shuffled order for each epoch rather than reshuffling at every repetition.
+  # Single-epoch datasets (e.g. centralized ones iterated by Keras) still get a
+  # new order each time they are iterated.
+  reshuffle_each_iteration = num_epochs == 1
+
   def preprocess_fn(dataset):
-    return dataset.shuffle(shuffle_buffer_size).repeat(num_epochs).batch(
-        batch_size, drop_remainder=False).map(
-            mapping_fn, num_parallel_calls=num_parallel_calls)
+    dataset = dataset.shuffle(
+        shuffle_buffer_size, reshuffle_each_iteration=reshuffle_each_iteration)
+    dataset = dataset.repeat(num_epochs).map(
+        mapping_fn, num_parallel_calls=num_parallel_calls)
+    dataset = dataset.batch(batch_size, drop_remainder=False).prefetch(
+        tf.data.experimental.AUTOTUNE)
+    return dataset.with_options(_get_dataset_options())
 
   return preprocess_fn
 
@@ -88,7 +262,8 @@ def get_federated_datasets(
     train_shuffle_buffer_size: int = MAX_CLIENT_DATASET_SIZE,
     test_shuffle_buffer_size: int = 1,
     only_digits: bool = False,
-    emnist_task: str = 'digit_recognition'
+    emnist_task: str = 'digit_recognition',
+    tfrecord_dir: Optional[str] = None
 ) -> Tuple[tff.simulation.datasets.ClientData,
            tff.simulation.datasets.ClientData]:
   """Loads and preprocesses federated EMNIST training and testing sets.
@@ -117,6 +292,10 @@ def get_federated_datasets(
       one of 'digit_recognition' or 'autoencoder'. If the former, then elements
       are mapped to tuples of the form (pixels, label), if the latter then
       elements are mapped to tuples of the form (pixels, pixels).
+    tfrecord_dir: An optional directory for per-client TFRecord copies of
+      EMNIST. If set, the SQLite-backed data is converted to TFRecord files in
+      this directory on first use, and client datasets are read from those
+      files instead. If `None`, the SQLite-backed data is used directly.
 
   Returns:
     A tuple (emnist_train, emnist_test) of `tff.simulation.datasets.ClientData`
@@ -133,8 +312,7 @@ def get_federated_datasets(
   if test_shuffle_buffer_size <= 1:
     test_shuffle_buffer_size = 1
 
-  emnist_train, emnist_test = tff.simulation.datasets.emnist.load_data(
-      only_digits=only_digits)
+  emnist_train, emnist_test = load_client_data(only_digits, tfrecord_dir)
 
   train_preprocess_fn = create_preprocess_fn(
       num_epochs=train_client_epochs_per_round,
@@ -159,7 +337,11 @@ def get_centralized_datasets(
     train_shuffle_buffer_size: int = 10000,
     test_shuffle_buffer_size: int = 1,
     only_digits: bool = False,
-    emnist_task: str = 'digit_recognition'
+    emnist_task: str = 'digit_recognition',
+    train_client_data: Optional[tff.simulation.datasets.ClientData] = None,
+    test_client_data: Optional[tff.simulation.datasets.ClientData] = None,
+    cache_path: Optional[str] = None,
+    tfrecord_dir: Optional[str] = None
 ) -> Tuple[tf.data.Dataset, tf.data.Dataset]:
   """Loads and preprocesses centralized EMNIST training and testing sets.
 
@@ -180,35 +362,119 @@ def get_centralized_datasets(
       one of 'digit_recognition' or 'autoencoder'. If the former, then elements
       are mapped to tuples of the form (pixels, label), if the latter then
       elements are mapped to tuples of the form (pixels, pixels).
+    train_client_data: An optional pre-loaded `ClientData` for the training
+      set. Must be provided together with `test_client_data`, in which case
+      they are used in place of loading EMNIST from disk, and `only_digits` and
+      `tfrecord_dir` are ignored.
+    test_client_data: An optional pre-loaded `ClientData` for the test set.
+    cache_path: An optional path prefix for caching the raw centralized
+      datasets via `tf.data.Dataset.cache`, to files with this prefix (suffixed
+      by `_train` and `_test`). If `None`, no caching is done. An empty string
+      caches in memory, which only helps when the returned datasets are
+      iterated directly (e.g. by Keras); datasets passed into TFF computations
+      are rebuilt on every call, so an in-memory cache is never reused there.
+    tfrecord_dir: An optional directory for per-client TFRecord copies of
+      EMNIST, as in `load_client_data`. If `None`, the SQLite-backed data is
+      used directly.
 
   Returns:
     A tuple (train_dataset, test_dataset) of `tf.data.Dataset` instances
     representing the centralized training and test datasets.
+
+  Raises:
+    ValueError: If exactly one of `train_client_data` and `test_client_data` is
+      provided.
   """
-  if train_shuffle_buffer_size <= 1:
-    train_shuffle_buffer_size = 1
-  if test_shuffle_buffer_size <= 1:
-    test_shuffle_buffer_size = 1
+  if (train_client_data is None) != (test_client_data is None):
+    raise ValueError('train_client_data and test_client_data must either both '
+                     'be provided or both be None.')
+  if train_client_data is None:
+    train_client_data, test_client_data = load_client_data(
+        only_digits, tfrecord_dir)
+
+  emnist_train = _get_centralized_dataset(
+      train_client_data,
+      batch_size=train_batch_size,
+      shuffle_buffer_size=train_shuffle_buffer_size,
+      emnist_task=emnist_task,
+      cache_path=_get_split_cache_path(cache_path, 'train'))
+  emnist_test = _get_centralized_dataset(
+      test_client_data,
+      batch_size=test_batch_size,
+      shuffle_buffer_size=test_shuffle_buffer_size,
+      emnist_task=emnist_task,
+      cache_path=_get_split_cache_path(cache_path, 'test'))
+  return emnist_train, emnist_test
 
-  emnist_train, emnist_test = tff.simulation.datasets.emnist.load_data(
-      only_digits=only_digits)
 
-  emnist_train = emnist_train.create_tf_dataset_from_all_clients()
-  emnist_test = emnist_test.create_tf_dataset_from_all_clients()
+def get_centralized_test_dataset(
+    test_batch_size: int = 500,
+    test_shuffle_buffer_size: int = 1,
+    only_digits: bool = False,
+    emnist_task: str = 'digit_recognition',
+    test_client_data: Optional[tff.simulation.datasets.ClientData] = None,
+    cache_path: Optional[str] = None,
+    tfrecord_dir: Optional[str] = None) -> tf.data.Dataset:
+  """Loads and preprocesses only the centralized EMNIST testing set.
 
-  train_preprocess_fn = create_preprocess_fn(
-      num_epochs=1,
-      batch_size=train_batch_size,
-      shuffle_buffer_size=train_shuffle_buffer_size,
-      emnist_task=emnist_task)
+  Unlike `get_centralized_datasets`, this does not build the centralized
+  training pipeline, which is useful when only the test set is needed (e.g. for
+  evaluation during federated training).
 
-  test_preprocess_fn = create_preprocess_fn(
-      num_epochs=1,
+  Args:
+    test_batch_size: The batch size for the test dataset.
+    test_shuffle_buffer_size: An integer specifying the buffer size used to
+      shuffle the test dataset via `tf.data.Dataset.shuffle`. If set to an
+      integer less than or equal to 1, no shuffling occurs.
+    only_digits: A boolean representing whether to take the digits-only
+      EMNIST-10 (with only 10 labels) or the full EMNIST-62 dataset with digits
+      and characters (62 labels). If set to True, we use EMNIST-10, otherwise we
+      use EMNIST-62.
+    emnist_task: A string indicating the EMNIST task being performed. Must be
+      one of 'digit_recognition' or 'autoencoder'.
+    test_client_data: An optional pre-loaded `ClientData` for the test set. If
+      provided, it is used in place of loading EMNIST from disk, and
+      `only_digits` and `tfrecord_dir` are ignored.
+    cache_path: An optional path prefix for caching the raw test dataset, with
+      the same semantics as in `get_centralized_datasets`.
+    tfrecord_dir: An optional directory for per-client TFRecord copies of
+      EMNIST, as in `load_client_data`. If `None`, the SQLite-backed data is
+      used directly.
+
+  Returns:
+    A `tf.data.Dataset` representing the centralized test dataset.
+  """
+  if test_client_data is None:
+    _, test_client_data = load_client_data(only_digits, tfrecord_dir)
+  return _get_centralized_dataset(
+      test_client_data,
       batch_size=test_batch_size,
       shuffle_buffer_size=test_shuffle_buffer_size,
+      emnist_task=emnist_task,
+      cache_path=_get_split_cache_path(cache_path, 'test'))
+
+
+def _get_split_cache_path(cache_path: Optional[str],
+                          split: str) -> Optional[str]:
+  """Returns the cache path for `split`, keeping `None` and `''` as is."""
+  if not cache_path:
+    return cache_path
+  return '{}_{}'.format(cache_path, split)
+
+
+def _get_centralized_dataset(client_data: tff.simulation.datasets.ClientData,
+                             batch_size: int, shuffle_buffer_size: int,
+                             emnist_task: str,
+                             cache_path: Optional[str]) -> tf.data.Dataset:
+  """Builds a preprocessed centralized dataset from all clients' data."""
+  dataset = client_data.create_tf_dataset_from_all_clients()
+  # Optionally cache the raw examples so that repeated iterations do not rescan
+  # the underlying client data.
+  if cache_path is not None:
+    dataset = dataset.cache(cache_path)
+  preprocess_fn = create_preprocess_fn(
+      num_epochs=1,
+      batch_size=batch_size,
+      shuffle_buffer_size=shuffle_buffer_size,
       emnist_task=emnist_task)
-
-  emnist_train = train_preprocess_fn(emnist_train)
-  emnist_test = test_preprocess_fn(emnist_test)
-
-  return emnist_train, emnist_test
+  return preprocess_fn(dataset)
@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import collections
+import os
 from unittest import mock
 
 import tensorflow as tf
@@ -91,11 +92,57 @@ class AutoencoderPreprocessFnTest(tf.test.TestCase):
     self.assertAllClose(self.evaluate(element), expected_element)
 
 
+def _create_labeled_dataset(num_examples):
+  return tf.data.Dataset.from_tensor_slices(
+      collections.OrderedDict(
+          label=tf.range(num_examples, dtype=tf.int32),
+          pixels=tf.zeros((num_examples, 28, 28), dtype=tf.float32)))
+
+
+class ShuffleOrderTest(tf.test.TestCase):
+
+  def test_multiple_epochs_reuse_shuffled_order(self):
+    tf.random.set_seed(0)
+    num_examples = 100
+    preprocess_fn = emnist_dataset.create_preprocess_fn(
+        num_epochs=3,
+        batch_size=num_examples,
+        shuffle_buffer_size=num_examples,
+        emnist_task='digit_recognition')
+    preprocessed_ds = preprocess_fn(_create_labeled_dataset(num_examples))
+
+    epoch_labels = [self.evaluate(labels) for _, labels in preprocessed_ds]
+    self.assertLen(epoch_labels, 3)
+    self.assertNotAllEqual(epoch_labels[0], list(range(num_examples)))
+    self.assertAllEqual(epoch_labels[0], epoch_labels[1])
+    self.assertAllEqual(epoch_labels[0], epoch_labels[2])
+
+  def test_single_epoch_reshuffles_on_each_iteration(self):
+    tf.random.set_seed(0)
+    num_examples = 100
+    preprocess_fn = emnist_dataset.create_preprocess_fn(
+        num_epochs=1,
+        batch_size=num_examples,
+        shuffle_buffer_size=num_examples,
+        emnist_task='digit_recognition')
+    preprocessed_ds = preprocess_fn(_create_labeled_dataset(num_examples))
+
+    _, first_labels = next(iter(preprocessed_ds))
+    _, second_labels = next(iter(preprocessed_ds))
+    self.assertAllEqual(
+        sorted(self.evaluate(first_labels)), list(range(num_examples)))
+    self.assertNotAllEqual(first_labels, second_labels)
+
+
 EMNIST_LOAD_DATA = 'tensorflow_federated.simulation.datasets.emnist.load_data'
 
 
 class FederatedDatasetTest(tf.test.TestCase):
 
+  def setUp(self):
+    super().setUp()
+    emnist_dataset._load_client_data.cache_clear()
+
   @mock.patch(EMNIST_LOAD_DATA)
   def test_preprocess_applied(self, mock_load_data):
     if tf.config.list_logical_devices('GPU'):
@@ -119,9 +166,50 @@ class FederatedDatasetTest(tf.test.TestCase):
     self.assertEqual(mock_test.mock_calls,
                      mock.call.preprocess(mock.ANY).call_list())
 
+  @mock.patch(EMNIST_LOAD_DATA)
+  def test_tfrecord_client_data_matches_source(self, mock_load_data):
+    train_data = collections.OrderedDict(
+        label=[1, 2], pixels=[tf.ones((28, 28)), tf.zeros((28, 28))])
+    test_data = collections.OrderedDict(
+        label=[3], pixels=[tf.fill((28, 28), 0.5)])
+    mock_load_data.return_value = (
+        tff.simulation.datasets.TestClientData({'a': train_data}),
+        tff.simulation.datasets.TestClientData({'b': test_data}))
+    tfrecord_dir = self.create_tempdir().full_path
+
+    emnist_train, emnist_test = emnist_dataset.load_client_data(
+        only_digits=False, tfrecord_dir=tfrecord_dir)
+    tfrecord_paths = tf.io.gfile.glob(
+        os.path.join(tfrecord_dir, '*', '*', '*.tfrecord'))
+    self.assertLen(tfrecord_paths, 2)
+    mtimes = [os.path.getmtime(path) for path in tfrecord_paths]
+
+    # After clearing the memoized loaders, a second load reads the existing
+    # TFRecord files without loading the SQLite data or rewriting the files.
+    emnist_dataset._load_client_data.cache_clear()
+    emnist_dataset.load_client_data(
+        only_digits=False, tfrecord_dir=tfrecord_dir)
+
+    mock_load_data.assert_called_once()
+    self.assertEqual([os.path.getmtime(path) for path in tfrecord_paths],
+                     mtimes)
+    self.assertEqual(emnist_train.client_ids, ['a'])
+    self.assertEqual(emnist_test.client_ids, ['b'])
+    train_elements = list(emnist_train.create_tf_dataset_for_client('a'))
+    self.assertLen(train_elements, 2)
+    self.assertEqual(train_elements[1]['label'], 2)
+    self.assertEqual(train_elements[1]['label'].dtype, tf.int32)
+    self.assertAllClose(train_elements[0]['pixels'], tf.ones((28, 28)))
+    test_elements = list(emnist_test.create_tf_dataset_for_client('b'))
+    self.assertAllClose(test_elements[0]['pixels'], tf.fill((28, 28), 0.5))
+
 
 class CentralizedDatasetTest(tf.test.TestCase):
 
+  def setUp(self):
+    super().setUp()
+    emnist_dataset._load_client_data.cache_clear()
+
   @mock.patch(EMNIST_LOAD_DATA)
   def test_preprocess_applied(self, mock_load_data):
     if tf.config.list_logical_devices('GPU'):
@@ -154,6 +242,133 @@ class CentralizedDatasetTest(tf.test.TestCase):
     self.assertEqual(mock_test.mock_calls,
                      mock.call.create_tf_dataset_from_all_clients().call_list())
 
+  @mock.patch(EMNIST_LOAD_DATA)
+  def test_load_data_is_cached(self, mock_load_data):
+    sample_ds = tf.data.Dataset.from_tensor_slices(TEST_DATA)
+    mock_train = mock.create_autospec(tff.simulation.datasets.ClientData)
+    mock_train.create_tf_dataset_from_all_clients = mock.Mock(
+        return_value=sample_ds)
+    mock_test = mock.create_autospec(tff.simulation.datasets.ClientData)
+    mock_test.create_tf_dataset_from_all_clients = mock.Mock(
+        return_value=sample_ds)
+    mock_load_data.return_value = (mock_train, mock_test)
+
+    _, _ = emnist_dataset.get_centralized_datasets()
+    _, _ = emnist_dataset.get_centralized_datasets()
+
+    mock_load_data.assert_called_once()
+
+  @mock.patch(EMNIST_LOAD_DATA)
+  def test_load_data_is_shared_with_federated_datasets(self, mock_load_data):
+    sample_ds = tf.data.Dataset.from_tensor_slices(TEST_DATA)
+    mock_train = mock.create_autospec(tff.simulation.datasets.ClientData)
+    mock_train.create_tf_dataset_from_all_clients = mock.Mock(
+        return_value=sample_ds)
+    mock_test = mock.create_autospec(tff.simulation.datasets.ClientData)
+    mock_test.create_tf_dataset_from_all_clients = mock.Mock(
+        return_value=sample_ds)
+    mock_load_data.return_value = (mock_train, mock_test)
+
+    _, _ = emnist_dataset.get_federated_datasets()
+    _, _ = emnist_dataset.get_centralized_datasets()
+    _ = emnist_dataset.get_centralized_test_dataset()
+
+    mock_load_data.assert_called_once()
+
+  @mock.patch(EMNIST_LOAD_DATA)
+  def test_tfrecord_dir_is_forwarded(self, mock_load_data):
+    mock_load_data.return_value = (
+        tff.simulation.datasets.TestClientData({'a': TEST_DATA}),
+        tff.simulation.datasets.TestClientData({'b': TEST_DATA}))
+    tfrecord_dir = self.create_tempdir().full_path
+
+    _, _ = emnist_dataset.get_centralized_datasets(tfrecord_dir=tfrecord_dir)
+    emnist_dataset._load_client_data.cache_clear()
+    test_ds = emnist_dataset.get_centralized_test_dataset(
+        tfrecord_dir=tfrecord_dir)
+
+    # The second call reads the TFRecord files written by the first one.
+    mock_load_data.assert_called_once()
+    self.assertLen(
+        tf.io.gfile.glob(os.path.join(tfrecord_dir, '*', '*', '*.tfrecord')), 2)
+    _, labels = next(iter(test_ds))
+    self.assertAllEqual(labels, [0])
+
+  @mock.patch(EMNIST_LOAD_DATA)
+  def test_preloaded_client_data_skips_load(self, mock_load_data):
+    sample_ds = tf.data.Dataset.from_tensor_slices(TEST_DATA)
+    mock_train = mock.create_autospec(tff.simulation.datasets.ClientData)
+    mock_train.create_tf_dataset_from_all_clients = mock.Mock(
+        return_value=sample_ds)
+    mock_test = mock.create_autospec(tff.simulation.datasets.ClientData)
+    mock_test.create_tf_dataset_from_all_clients = mock.Mock(
+        return_value=sample_ds)
+
+    _, _ = emnist_dataset.get_centralized_datasets(
+        train_client_data=mock_train, test_client_data=mock_test)
+
+    mock_load_data.assert_not_called()
+    self.assertEqual(mock_test.mock_calls,
+                     mock.call.create_tf_dataset_from_all_clients().call_list())
+
+  @mock.patch(EMNIST_LOAD_DATA)
+  def test_test_dataset_only_builds_test_split(self, mock_load_data):
+    sample_ds = tf.data.Dataset.from_tensor_slices(TEST_DATA)
+    mock_train = mock.create_autospec(tff.simulation.datasets.ClientData)
+    mock_test = mock.create_autospec(tff.simulation.datasets.ClientData)
+    mock_test.create_tf_dataset_from_all_clients = mock.Mock(
+        return_value=sample_ds)
+    mock_load_data.return_value = (mock_train, mock_test)
+
+    test_ds = emnist_dataset.get_centralized_test_dataset()
+
+    mock_load_data.assert_called_once()
+    self.assertEqual(mock_train.mock_calls, [])
+    self.assertEqual(mock_test.mock_calls,
+                     mock.call.create_tf_dataset_from_all_clients().call_list())
+    self.assertEqual(test_ds.element_spec,
+                     (tf.TensorSpec(shape=(None, 28, 28, 1), dtype=tf.float32),
+                      tf.TensorSpec(shape=(None,), dtype=tf.int32)))
+
+  def test_file_cache_is_reused(self):
+    # The file-backed cache survives rebuilding the dataset pipeline, as happens
+    # when the dataset is serialized into a TFF computation.
+    cache_path = self.get_temp_dir() + '/emnist_cache'
+    count = tf.Variable(0, dtype=tf.int64)
+
+    def count_element(element):
+      count.assign_add(1)
+      return element
+
+    def build_test_dataset():
+      sample_ds = tf.data.Dataset.from_tensor_slices(TEST_DATA).map(
+          count_element)
+      mock_train = mock.create_autospec(tff.simulation.datasets.ClientData)
+      mock_train.create_tf_dataset_from_all_clients = mock.Mock(
+          return_value=sample_ds)
+      mock_test = mock.create_autospec(tff.simulation.datasets.ClientData)
+      mock_test.create_tf_dataset_from_all_clients = mock.Mock(
+          return_value=sample_ds)
+      _, test_ds = emnist_dataset.get_centralized_datasets(
+          train_client_data=mock_train,
+          test_client_data=mock_test,
+          cache_path=cache_path)
+      return test_ds
+
+    list(build_test_dataset())
+    self.assertEqual(count.numpy(), 1)
+    list(build_test_dataset())
+    self.assertEqual(count.numpy(), 1)
+
+  @mock.patch(EMNIST_LOAD_DATA)
+  def test_raises_with_only_one_preloaded_client_data(self, mock_load_data):
+    mock_test = mock.create_autospec(tff.simulation.datasets.ClientData)
+    with self.assertRaises(ValueError):
+      emnist_dataset.get_centralized_datasets(test_client_data=mock_test)
+    with self.assertRaises(ValueError):
+      emnist_dataset.get_centralized_datasets(train_client_data=mock_test)
+    mock_load_data.assert_not_called()
+
 
 if __name__ == '__main__':
   tf.test.main()